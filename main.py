@@ -1,5 +1,43 @@
+import glob
+import os
+import sys
+import tempfile
+
+
 def main():
-    print("Hello from gemini!")
+    """Serve the web demo (`web.app:app`) with uvicorn.
+
+    Set DEV=1 for a single auto-reloading worker; otherwise run one worker per
+    core on uvloop + httptools (uvloop is unavailable on Windows).
+    """
+    import uvicorn
+
+    dev = bool(os.getenv("DEV"))
+    options = dict(
+        host="0.0.0.0",
+        port=8000,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=1 if dev else (os.cpu_count() or 1),
+        reload=dev,
+    )
+    if dev:
+        uvicorn.run("web.app:app", **options)
+        return
+
+    # Workers inherit PROMETHEUS_MULTIPROC_DIR and write metrics to files there
+    # that /metrics aggregates. The directory must start empty: clear stale
+    # files from a user-supplied one, otherwise use a temporary directory that
+    # is removed on exit.
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+            os.remove(path)
+        uvicorn.run("web.app:app", **options)
+        return
+    with tempfile.TemporaryDirectory(prefix="prometheus_", ignore_cleanup_errors=True) as multiproc_dir:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = multiproc_dir
+        uvicorn.run("web.app:app", **options)
 
 
 if __name__ == "__main__":
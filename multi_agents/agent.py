@@ -1,23 +1,71 @@
+import asyncio
 import datetime
-import random
-import difflib
+import importlib.util
 import logging
+import weakref
 from zoneinfo import ZoneInfo
-from typing import Dict, Any, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 from functools import lru_cache
+from cachetools import LRUCache, TTLCache
 from google.adk.agents import Agent
+from rapidfuzz import fuzz, process
 
+# Each optional dependency is guarded on its own so one missing or broken
+# package only disables the feature that needs it.
 try:
+    import httpx
+except Exception:
+    httpx = None  # type: ignore
+
+try:
+    from geopy.adapters import RequestsAdapter
     from geopy.geocoders import Nominatim
+
+    # Built once: geopy's RequestsAdapter keeps one requests.Session for the
+    # geolocator's lifetime, so Nominatim calls reuse its keep-alive pool.
+    _GEOLOCATOR = Nominatim(user_agent="gemini_weather_agent", adapter_factory=RequestsAdapter)
+except Exception:
+    _GEOLOCATOR = None
+
+try:
     from timezonefinder import TimezoneFinder
-    import requests
+
+    # Built once: TimezoneFinder loads its polygon data only at construction.
+    _TZFINDER = TimezoneFinder()
 except Exception:
-    Nominatim = None  # type: ignore
-    TimezoneFinder = None  # type: ignore
-    requests = None  # type: ignore
+    _TZFINDER = None
 
 logger = logging.getLogger(__name__)
 
+# Async HTTP clients for Open-Meteo, one per event loop: pooled connections are
+# bound to the loop that opened them, so a client can't be reused across loops
+# (e.g. repeated `asyncio.run` calls). See `_get_client` and `aclose()`.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+# HTTP/2 needs the optional `h2` package (the `httpx[http2]` extra).
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+_VALID_UNITS = frozenset({"C", "F", "c", "f"})
+
+_OM_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Current conditions only change every ~10-15 minutes, so cache Open-Meteo
+# responses per ~110m grid cell. `_wx_inflight` holds the one running fetch per
+# key so concurrent misses for the same place share a single request.
+_wx_cache: TTLCache = TTLCache(maxsize=1024, ttl=600)
+_wx_cache_get = _wx_cache.get
+_wx_cache_set = _wx_cache.__setitem__
+_wx_inflight: Dict[Tuple[float, float], "asyncio.Future[Any]"] = {}
+
+# Geocoding results (including misses) keyed by normalized city name, with the
+# same one-fetch-per-key scheme as above.
+_MISSING = object()
+_geocode_results: LRUCache = LRUCache(maxsize=256)
+_geocode_inflight: Dict[str, "asyncio.Future[Any]"] = {}
+
+# Timezone names keyed by coordinates quantized to ~110m: raw geocoder floats
+# rarely repeat exactly, while timezone boundaries are far coarser than that.
+_tz_results: LRUCache = LRUCache(maxsize=4096)
+
 # Keep a small built-in fallback for offline demo and unit tests.
 CITY_WEATHER: Dict[str, Dict[str, Any]] = {
     "new york": {
@@ -50,31 +98,81 @@ CITY_WEATHER: Dict[str, Dict[str, Any]] = {
     },
 }
 
+# Lookup set and fuzzy-match choice list, built once rather than on every lookup.
+_CITY_KEYS = frozenset(CITY_WEATHER)
+_CITY_KEYS_TUPLE = tuple(CITY_WEATHER)
+
+# Hot-path callables bound once to skip attribute lookups per call.
+_extract_one = process.extractOne
+_now = datetime.datetime.now
+
+
+@lru_cache(maxsize=64)
+def _zi(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+# The built-in cities are static, so resolve their timezones once at import.
+for _base in CITY_WEATHER.values():
+    _base["_zi"] = _zi(_base.get("tz", "UTC"))
+del _base
+
 
 def _normalize(city: str) -> str:
     return city.strip().lower()
 
 
 def _find_best_city(city: str) -> Optional[str]:
-    choices = list(CITY_WEATHER.keys())
     key = _normalize(city)
-    if key in CITY_WEATHER:
+    # Exact hits skip the fuzzy matcher entirely.
+    if key in _CITY_KEYS:
         return key
-    matches = difflib.get_close_matches(key, choices, n=1, cutoff=0.6)
-    return matches[0] if matches else None
+    match = _extract_one(key, _CITY_KEYS_TUPLE, scorer=fuzz.ratio, score_cutoff=60)
+    return match[0] if match else None
 
 
-@lru_cache(maxsize=256)
-def _geocode(city: str) -> Optional[Tuple[float, float, str]]:
+async def _singleflight(
+    inflight: Dict[Any, "asyncio.Future[Any]"], key: Any, fetch: Callable[[], Awaitable[Any]]
+) -> Any:
+    """Await the in-flight task for `key`, starting `fetch()` if there is none.
+
+    Concurrent callers share that one task and its result, None included, and
+    only the task itself removes its entry once it finishes.
+    """
+    task = inflight.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(fetch())
+        inflight[key] = task
+        task.add_done_callback(lambda t: inflight.pop(key) if inflight.get(key) is t else None)
+    # Shield so one cancelled caller doesn't cancel the fetch the others await.
+    return await asyncio.shield(task)
+
+
+async def _geocode(city: str) -> Optional[Tuple[float, float, str]]:
     """Return (lat, lon, display_name) using Nominatim or None on failure.
 
-    Cached to reduce Nominatim usage.
+    Cached to reduce Nominatim usage, and concurrent lookups for the same city
+    within this process share one request.
     """
-    if Nominatim is None:
+    if _GEOLOCATOR is None:
         return None
+    key = _normalize(city)
+    result = _geocode_results.get(key, _MISSING)
+    if result is not _MISSING:
+        return result
+
+    async def fetch() -> Optional[Tuple[float, float, str]]:
+        # Geopy is blocking, so run it off the event loop.
+        result = await asyncio.to_thread(_geocode_sync, city)
+        _geocode_results[key] = result
+        return result
+
+    return await _singleflight(_geocode_inflight, key, fetch)
+
+
+def _geocode_sync(city: str) -> Optional[Tuple[float, float, str]]:
     try:
-        geolocator = Nominatim(user_agent="gemini_weather_agent")
-        loc = geolocator.geocode(city, exactly_one=True, timeout=10)
+        loc = _GEOLOCATOR.geocode(city, exactly_one=True, timeout=10)
         if not loc:
             return None
         return (loc.latitude, loc.longitude, loc.address)
@@ -83,27 +181,56 @@ def _geocode(city: str) -> Optional[Tuple[float, float, str]]:
         return None
 
 
-@lru_cache(maxsize=256)
-def _tz_from_coords(lat: float, lon: float) -> Optional[str]:
-    if TimezoneFinder is None:
+async def _tz_from_coords(lat: float, lon: float) -> Optional[str]:
+    """Return the timezone name at (lat, lon) or None on failure.
+
+    Cache misses call TimezoneFinder inline: an uncached lookup takes a few
+    microseconds, well below the cost of a thread or process hop.
+    """
+    if _TZFINDER is None:
         return None
+    key = (round(lat * 1000), round(lon * 1000))
+    tz = _tz_results.get(key, _MISSING)
+    if tz is not _MISSING:
+        return tz
     try:
-        tf = TimezoneFinder()
-        return tf.timezone_at(lng=lon, lat=lat)
+        tz = _TZFINDER.timezone_at(lng=key[1] / 1000, lat=key[0] / 1000)
     except Exception as e:
         logger.debug("Timezone lookup failed: %s", e)
         return None
+    _tz_results[key] = tz
+    return tz
+
+
+def _get_client() -> "httpx.AsyncClient":
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = httpx.AsyncClient(timeout=10, http2=_HTTP2)
+    return client
 
 
-def _open_meteo_current(lat: float, lon: float) -> Optional[Dict[str, Any]]:
-    if requests is None:
+async def _open_meteo_current(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    if httpx is None:
         return None
+    key = (round(lat, 3), round(lon, 3))
+    data = _wx_cache_get(key)
+    if data is not None:
+        return data
+
+    async def fetch() -> Optional[Dict[str, Any]]:
+        data = await _fetch_open_meteo(lat, lon)
+        if data is not None:
+            _wx_cache_set(key, data)
+        return data
+
+    return await _singleflight(_wx_inflight, key, fetch)
+
+
+async def _fetch_open_meteo(lat: float, lon: float) -> Optional[Dict[str, Any]]:
     try:
-        url = (
-            f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}"
-            "&current_weather=true&timezone=auto"
-        )
-        r = requests.get(url, timeout=10)
+        params = {"latitude": lat, "longitude": lon, "current_weather": "true", "timezone": "auto"}
+        r = await _get_client().get(_OM_URL, params=params)
         r.raise_for_status()
         data = r.json()
         return data
@@ -112,67 +239,90 @@ def _open_meteo_current(lat: float, lon: float) -> Optional[Dict[str, Any]]:
         return None
 
 
-def get_weather(city: str, units: str = "C") -> Dict[str, Any]:
+async def aclose() -> None:
+    """Close the HTTP client of the running event loop. Call once on
+    application shutdown."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def get_weather(city: str, units: str = "C") -> Dict[str, Any]:
     """Get weather for any city using OSM geocoding + Open-Meteo, with fallback.
 
     If external libraries are missing or remote calls fail, falls back to the
     built-in `CITY_WEATHER` data for a small set of cities.
     """
-    if units.upper() not in ("C", "F"):
+    if units not in _VALID_UNITS:
         return {"status": "error", "error_message": "`units` must be 'C' or 'F'."}
+    u = units.upper()
 
     # First try local fuzzy match
     match = _find_best_city(city)
     if match:
         base = CITY_WEATHER[match]
-        temp_c = round(base["temp_c"] + random.uniform(-1.5, 1.5), 1)
-        humidity = max(0, min(100, base["humidity"] + random.randint(-3, 3)))
-        wind_kph = round(max(0, base["wind_kph"] + random.uniform(-2, 2)), 1)
-        tz = ZoneInfo(base.get("tz", "UTC"))
-        now = datetime.datetime.now(tz)
-        temp = round(temp_c * 9.0 / 5.0 + 32.0, 1) if units.upper() == "F" else temp_c
-        unit_label = "F" if units.upper() == "F" else "C"
+        name = match.title()
+        temp_c = base["temp_c"]
+        condition = base["condition"]
+        humidity = base["humidity"]
+        wind_kph = base["wind_kph"]
+        now = _now(base["_zi"])
+        temp = round(temp_c * 9.0 / 5.0 + 32.0, 1) if u == "F" else temp_c
         data = {
-            "city": match.title(),
+            "city": name,
             "temp_c": temp_c,
             "temp": temp,
-            "units": unit_label,
-            "condition": base["condition"],
+            "units": u,
+            "condition": condition,
             "humidity": humidity,
             "wind_kph": wind_kph,
             "timestamp": now.isoformat(),
         }
         report = (
-            f"The weather in {data['city']} is {data['condition']} with a temperature of "
-            f"{data['temp']}°{data['units']} ({data['temp_c']}°C). Humidity: {data['humidity']}%. "
-            f"Wind: {data['wind_kph']} kph."
+            f"The weather in {name} is {condition} with a temperature of "
+            f"{temp}°{u} ({temp_c}°C). Humidity: {humidity}%. "
+            f"Wind: {wind_kph} kph."
         )
         return {"status": "success", "report": report, "data": data}
 
     # Attempt geocode + Open-Meteo
-    geocoded = _geocode(city)
+    geocoded = await _geocode(city)
     if not geocoded:
         return {"status": "error", "error_message": f"Weather information for '{city}' is not available."}
 
     lat, lon, display_name = geocoded
-    om = _open_meteo_current(lat, lon)
+    # The timezone lookup only needs coordinates, so overlap it with the
+    # Open-Meteo request instead of running it afterwards.
+    om, tz_name = await asyncio.gather(
+        _open_meteo_current(lat, lon),
+        _tz_from_coords(lat, lon),
+        return_exceptions=True,
+    )
+    if isinstance(om, BaseException):
+        logger.debug("Open-Meteo request failed: %s", om)
+        om = None
+    if isinstance(tz_name, BaseException):
+        logger.debug("Timezone lookup failed: %s", tz_name)
+        tz_name = None
     if om and "current_weather" in om:
-        cw = om["current_weather"]
+        cw_get = om["current_weather"].get
         # Open-Meteo returns temperature in °C and windspeed in km/h (per docs)
-        temp_c = round(cw.get("temperature"), 1) if cw.get("temperature") is not None else None
-        wind = round(cw.get("windspeed"), 1) if cw.get("windspeed") is not None else None
+        temperature = cw_get("temperature")
+        windspeed = cw_get("windspeed")
+        temp_c = round(temperature, 1) if temperature is not None else None
+        wind = round(windspeed, 1) if windspeed is not None else None
+        condition = cw_get("weathercode")
         # humidity isn't part of current_weather; try to fetch hourly humidity if available
         humidity = None
-        tz = _tz_from_coords(lat, lon) or om.get("timezone") or "UTC"
-        now = datetime.datetime.now(ZoneInfo(tz))
-        temp = round(temp_c * 9.0 / 5.0 + 32.0, 1) if (units.upper() == "F" and temp_c is not None) else temp_c
-        unit_label = "F" if units.upper() == "F" else "C"
+        tz = tz_name or om.get("timezone") or "UTC"
+        now = _now(_zi(tz))
+        temp = round(temp_c * 9.0 / 5.0 + 32.0, 1) if (u == "F" and temp_c is not None) else temp_c
         data = {
             "city": display_name,
             "temp_c": temp_c,
             "temp": temp,
-            "units": unit_label,
-            "condition": cw.get("weathercode"),
+            "units": u,
+            "condition": condition,
             "humidity": humidity,
             "wind_kph": wind,
             "timestamp": now.isoformat(),
@@ -180,39 +330,39 @@ def get_weather(city: str, units: str = "C") -> Dict[str, Any]:
             "lon": lon,
         }
         report = (
-            f"The weather in {display_name} is {data['condition']} with a temperature of "
-            f"{data['temp']}°{data['units']} ({data['temp_c']}°C). Wind: {data['wind_kph']} kph."
+            f"The weather in {display_name} is {condition} with a temperature of "
+            f"{temp}°{u} ({temp_c}°C). Wind: {wind} kph."
         )
         return {"status": "success", "report": report, "data": data}
 
     return {"status": "error", "error_message": f"Could not retrieve weather for '{city}' at this time."}
 
 
-def get_current_time(city: str) -> Dict[str, Any]:
+async def get_current_time(city: str) -> Dict[str, Any]:
     """Return the current local time for a city using geocoding + timezone lookup.
 
     Falls back to built-in cities if external lookups are unavailable.
     """
     match = _find_best_city(city)
     if match:
-        tz_identifier = CITY_WEATHER[match].get("tz", "UTC")
-        tz = ZoneInfo(tz_identifier)
-        now = datetime.datetime.now(tz)
+        base = CITY_WEATHER[match]
+        tz_identifier = base.get("tz", "UTC")
+        now = _now(base["_zi"])
         iso = now.isoformat()
         report = f"The current time in {match.title()} is {now.strftime('%Y-%m-%d %H:%M:%S %Z%z')}"
         return {"status": "success", "report": report, "iso": iso, "timezone": tz_identifier}
 
-    geocoded = _geocode(city)
+    geocoded = await _geocode(city)
     if not geocoded:
         return {"status": "error", "error_message": f"Sorry, I don't have timezone information for {city}."}
 
     lat, lon, display_name = geocoded
-    tz_identifier = _tz_from_coords(lat, lon)
+    tz_identifier = await _tz_from_coords(lat, lon)
     if not tz_identifier:
         return {"status": "error", "error_message": f"Could not determine timezone for {city}."}
 
-    tz = ZoneInfo(tz_identifier)
-    now = datetime.datetime.now(tz)
+    tz = _zi(tz_identifier)
+    now = _now(tz)
     iso = now.isoformat()
     report = f"The current time in {display_name} is {now.strftime('%Y-%m-%d %H:%M:%S %Z%z')}"
     return {"status": "success", "report": report, "iso": iso, "timezone": tz_identifier}
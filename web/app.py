@@ -1,13 +1,30 @@
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+import os
+from typing import Annotated
+
+from fastapi import FastAPI, Form, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import time
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+import orjson
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
 
 from multi_agents import agent
 
-app = FastAPI(title="Gemini Multi-Agent Demo")
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson, which serializes the agent's plain
+    result dicts several times faster than the stdlib encoder."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+app = FastAPI(title="Gemini Multi-Agent Demo", default_response_class=ORJSONResponse)
+# Compress larger bodies (notably /metrics) for clients sending Accept-Encoding: gzip.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 templates = Jinja2Templates(directory="web/templates")
 
 try:
@@ -16,10 +33,37 @@ except Exception:
     # static folder is optional
     pass
 
+# Upper bound on `city` so oversized input is rejected (422) before it reaches
+# fuzzy matching or geocoding. The field defaults to "" because FastAPI treats
+# an empty required form field as missing (422); `_clean_city` answers empty
+# or whitespace-only input with a 400 instead.
+MAX_CITY_LEN = 128
+CityForm = Annotated[str, Form(max_length=MAX_CITY_LEN)]
+
 # Prometheus metrics
 REQUEST_COUNT = Counter("agent_requests_total", "Total agent requests", ["endpoint", "method", "status"])
 REQUEST_LATENCY = Histogram("agent_request_latency_seconds", "Request latency seconds", ["endpoint"])
 
+# Label-bound children, resolved once instead of via `.labels()` per request.
+_LAT_WEATHER = REQUEST_LATENCY.labels(endpoint="/api/weather")
+_CNT_WEATHER_OK = REQUEST_COUNT.labels(endpoint="/api/weather", method="POST", status="success")
+_CNT_WEATHER_ERR = REQUEST_COUNT.labels(endpoint="/api/weather", method="POST", status="error")
+_LAT_TIME = REQUEST_LATENCY.labels(endpoint="/api/time")
+_CNT_TIME_OK = REQUEST_COUNT.labels(endpoint="/api/time", method="POST", status="success")
+_CNT_TIME_ERR = REQUEST_COUNT.labels(endpoint="/api/time", method="POST", status="error")
+
+
+def _clean_city(city: str) -> str:
+    city = city.strip()
+    if not city:
+        raise HTTPException(status_code=400, detail="`city` must not be empty.")
+    return city
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await agent.aclose()
+
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -27,40 +71,42 @@ async def home(request: Request):
 
 
 @app.post("/api/weather")
-async def api_weather(city: str = Form(...), units: str = Form("C")):
-    start = time.time()
+async def api_weather(city: CityForm = "", units: str = Form("C")):
+    start = time.perf_counter()
     status = "error"
     try:
-        res = agent.get_weather(city, units)
+        city = _clean_city(city)
+        res = await agent.get_weather(city, units)
         status = "success" if res.get("status") == "success" else "error"
-        return JSONResponse(res)
+        return ORJSONResponse(res)
     finally:
-        elapsed = time.time() - start
-        REQUEST_LATENCY.labels(endpoint="/api/weather").observe(elapsed)
-        REQUEST_COUNT.labels(endpoint="/api/weather", method="POST", status=status).inc()
+        elapsed = time.perf_counter() - start
+        _LAT_WEATHER.observe(elapsed)
+        (_CNT_WEATHER_OK if status == "success" else _CNT_WEATHER_ERR).inc()
 
 
 @app.post("/api/time")
-async def api_time(city: str = Form(...)):
-    start = time.time()
+async def api_time(city: CityForm = ""):
+    start = time.perf_counter()
     status = "error"
     try:
-        res = agent.get_current_time(city)
+        city = _clean_city(city)
+        res = await agent.get_current_time(city)
         status = "success" if res.get("status") == "success" else "error"
-        return JSONResponse(res)
+        return ORJSONResponse(res)
     finally:
-        elapsed = time.time() - start
-        REQUEST_LATENCY.labels(endpoint="/api/time").observe(elapsed)
-        REQUEST_COUNT.labels(endpoint="/api/time", method="POST", status=status).inc()
+        elapsed = time.perf_counter() - start
+        _LAT_TIME.observe(elapsed)
+        (_CNT_TIME_OK if status == "success" else _CNT_TIME_ERR).inc()
 
 
 @app.get("/metrics")
 async def metrics():
-    data = generate_latest()
-    return PlainTextResponse(data.decode("utf-8"), media_type=CONTENT_TYPE_LATEST)
-
-
-if __name__ == "__main__":
-    import uvicorn
+    # With several uvicorn workers each process has its own registry, so merge
+    # the per-process files written under PROMETHEUS_MULTIPROC_DIR.
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
-    uvicorn.run("web.app:app", host="0.0.0.0", port=8000, reload=True)